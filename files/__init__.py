@@ -16,6 +16,9 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 # The `files` folder contains classes used to represent specialized files,
 # as well as classes needed to analyze their contents
+import re
+from functools import lru_cache
+
 from . import elf, symlink
 
 
@@ -26,3 +29,29 @@ FILE_TYPES = [
     elf.ElfFile,
     symlink.SymlinkFile
 ]
+
+# Combine the recognize_regex of all classes, so the type of a file is only
+# matched once (alternatives are tried in order, like FILE_TYPES)
+_RECOGNIZE_REGEX = re.compile("|".join(
+    "(?P<{}>{})".format(file_class.__name__, file_class.recognize_regex.pattern)
+    for file_class in FILE_TYPES
+))
+_CLASSES_BY_NAME = {file_class.__name__: file_class for file_class in FILE_TYPES}
+
+
+def recognize(file_type: dict):
+    """
+    Return the class of FILE_TYPES which should be used to analyze files with
+    the given type, or None if there is none
+    """
+    return _recognize_description(file_type["full"])
+
+
+@lru_cache(maxsize=1024)
+def _recognize_description(description):
+    # Many files share the same description, so only match each one once
+    match = _RECOGNIZE_REGEX.match(description)
+    if match is None:
+        return None
+
+    return _CLASSES_BY_NAME[match.lastgroup]
@@ -15,11 +15,24 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import re
+import tempfile
 import subprocess
+from functools import lru_cache
 
 from helpers.logger import Logger
 
 
+# Approximate size of the blocks of output lines filtered at once
+FILTER_BLOCK_SIZE = 65536
+
+
+@lru_cache(maxsize=1024)
+def _compile(pattern, flags=0):
+    # re's own cache is small and shared with all other modules, while
+    # patterns here often contain file paths so there are many of them
+    return re.compile(pattern, flags)
+
+
 class Analyzer:
     def __init__(self, path, config):
         self.path = path
@@ -27,16 +40,23 @@ class Analyzer:
 
     def run(self):
         """
-        Builds a generator with the filtered output lines
-        of all commands that this Analyzer runs
+        Starts all the commands that this Analyzer runs, and returns a list of
+        their outputs (CommandOutput instances, which must be closed once done)
         """
         raise NotImplementedError
 
 
 class Regex:
-    def __init__(self, pattern, replace):
+    def __init__(self, pattern, replace, flags=0, literal=None):
+        """
+        literal is an optional substring which any match must contain, so the
+        pattern is only applied to strings where it's found (searching for a
+        substring is much faster than running the regex engine)
+        """
+        self.flags = flags
         self.pattern = pattern
         self.replace = replace
+        self.literal = literal
 
     @property
     def pattern(self):
@@ -44,21 +64,63 @@ class Regex:
 
     @pattern.setter
     def pattern(self, pattern):
-        self._compiled = re.compile(pattern)
+        self._compiled = _compile(pattern, self.flags)
 
     def apply(self, string):
         """
         Returns the string with the substrings matching self.pattern replaced
         by self.replace
         """
+        if self.literal is not None and self.literal not in string:
+            return string
+
         return self._compiled.sub(self.replace, string)
 
 
+class CommandOutput:
+    """
+    Filtered output lines of a command which was started, to iterate over
+    Closing it (or using it as a context manager) stops the command and
+    releases its resources, even if its output was never read
+    """
+    def __init__(self, lines, process=None, stderr=None):
+        self._lines = lines
+        self._process = process
+        self._stderr = stderr
+
+    def __iter__(self):
+        return self._lines
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        # Stops the generator if it was started, which cleans up by itself
+        # (empty commands only have a plain iterator, with nothing to stop)
+        close_lines = getattr(self._lines, "close", None)
+        if close_lines is not None:
+            close_lines()
+
+        if self._process is not None and self._process.returncode is None:
+            # The output was never read, so the command can't be left running
+            self._process.kill()
+            self._process.stdout.close()
+            self._process.wait()
+
+        if self._stderr is not None:
+            self._stderr.close()
+
+
 class Command:
     @classmethod
     def make_regex(cls, path):
         """
         Returns a list of Regex instances to apply to the output of this command
+        Note: They are applied to blocks of several lines, so patterns should
+        use re.MULTILINE and not match newlines where it matters
         """
         return []
 
@@ -80,7 +142,11 @@ class Command:
     @classmethod
     def run(cls, file, *args, **kwargs):
         """
-        Run this command and return a generator of filtered output lines
+        Start this command and return its filtered output lines, as a
+        CommandOutput which must be closed once done
+        The command starts right away, so several commands can run at the same
+        time, but its output is only filtered as it is consumed, so it never
+        has to be stored in memory entirely
         Note: This is not profilable so subclasses should override it to make
         sure it's taken into account by --profile
         """
@@ -89,29 +155,71 @@ class Command:
 
         # Handle empty commands to save some time
         if cmd is None:
-            return iter(())
+            return CommandOutput(iter(()))
 
         Logger.debug("Running command {}".format(" ".join(cmd)))
-        process = subprocess.run(
+
+        # Errors are written to a file, as the process would block if it
+        # filled a pipe which isn't read until it exits
+        stderr = tempfile.TemporaryFile()
+        process = subprocess.Popen(
             cmd,
-            shell=False,
-            close_fds=True,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+            stderr=stderr,
+            bufsize=1 << 20
         )
 
-        if process.stderr:
+        lines = cls._read_output(cmd, process, stderr, regex)
+        return CommandOutput(lines, process, stderr)
+
+    @classmethod
+    def _read_output(cls, cmd, process, stderr, regex):
+        """
+        Generator of the filtered output lines of the given process, which
+        then waits for it to exit and reports errors
+        """
+        with stderr, process:
+            try:
+                yield from cls._filter(process.stdout, regex)
+            except BaseException:
+                # The output won't be read anymore (the generator was closed
+                # or interrupted), so don't wait for the command to finish
+                process.kill()
+                raise
+
+            # Make sure all errors were written before reading them
+            process.wait()
+            stderr.seek(0)
+            errors = stderr.read()
+
+        if errors:
             text = "Error while running command \"{}\": {}".format(
                 " ".join(cmd),
-                process.stderr.decode("utf-8")
+                errors.decode("utf-8")
             )
             Logger.warn(text)
 
-        return cls._filter(process.stdout.splitlines(True), regex)
-
     @classmethod
     def _filter(cls, output, regex):
-        for line in output:
-            for reg in regex:
-                line = reg.apply(line)
-            yield line
+        # Filter blocks of lines rather than single lines, so the regex engine
+        # is only called once for many lines. Blocks are read as raw chunks
+        # cut after their last newline, so lines are never split individually
+        rest = b""
+        for chunk in iter(lambda: output.read(FILTER_BLOCK_SIZE), b""):
+            end = chunk.rfind(b"\n") + 1
+            if end == 0:
+                # No complete line yet
+                rest += chunk
+                continue
+
+            yield cls._apply(rest + chunk[:end], regex)
+            rest = chunk[end:]
+
+        if rest:
+            yield cls._apply(rest, regex)
+
+    @staticmethod
+    def _apply(block, regex):
+        for reg in regex:
+            block = reg.apply(block)
+        return block
@@ -16,18 +16,48 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import os
 import re
-import itertools
 import subprocess
-from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, lru_cache
 
 from .generic import UnpackedFile
 from .analyzer import Analyzer, Command, Regex
 
 from helpers.logger import Logger
 from helpers.profiler import Profiler
-from helpers.utils import compute_fuzzy_hash
+from helpers.utils import compute_fuzzy_hash, compute_digest
+from helpers.digest_cache import cached
 from helpers.file_comparator import FileComparator
 
+# Digests of the comparable content of ELF files, indexed by the identity of
+# the original file so files appearing in several pairs are analyzed once
+_DIGESTS = {}
+
+
+def compute_comparable_paths(files):
+    """
+    Compute the comparable paths of the given ELF files which don't have one
+    yet, in parallel
+    Threads are enough since most of the time is spent waiting for readelf
+    and objdump
+    """
+    pending = [
+        file for file in files
+        if isinstance(file, ElfFile) and "_comparable_path" not in vars(file)
+    ]
+
+    if len(pending) < 2:
+        # Nothing to run in parallel, paths will be computed when accessed
+        return
+
+    with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+        paths = executor.map(ElfFile._make_comparable_path, pending)
+
+        # Fill the cached_property values directly, as computing them through
+        # the property would hold a lock shared by all instances
+        for file, path in zip(pending, paths):
+            file._comparable_path = path
+
 
 class ElfAnalyzer(Analyzer):
     def __init__(self, path, config):
@@ -45,29 +75,31 @@ class ElfAnalyzer(Analyzer):
             self.data_sections.append(section_name)
 
     def run(self):
-        section_output = ElfSectionCommand.run(self.path, self.config, self.data_sections)
-        code_output = ElfCodeSectionCommand.run(self.path, self.config, self.code_sections)
-        return itertools.chain(section_output, code_output)
+        return [
+            ElfSectionCommand.run(self.path, self.config, self.data_sections),
+            ElfCodeSectionCommand.run(self.path, self.config, self.code_sections)
+        ]
 
 
 class ElfSectionCommand(Command):
     @classmethod
+    @lru_cache(maxsize=1024)
     def make_regex(cls, path):
-        path_dir = re.escape(os.path.dirname(path).encode("utf-8"))
-        path = re.escape(path.encode("utf-8"))
-        regex_list = []
-
-        # Order matters:
-        # First match the full path to the file
-        regex_list.append(Regex(rb"%s\b" % path, b"/file"))
-
-        # Then match the directory containing the file
-        regex_list.append(Regex(rb"%s\b" % path_dir, b"/"))
-
-        # Finally, match every hex value (possible offset or address)
-        regex_list.append(Regex(rb"0x[0-9a-f]+", b"0x"))
-
-        return regex_list
+        path_dir = os.path.dirname(path).encode("utf-8")
+        path = path.encode("utf-8")
+
+        # Each pattern is applied to whole blocks of output, which is cheaper
+        # than combining them in a single pattern needing a Python callback
+        # Order matters
+        # Note: results are cached, so return an immutable tuple
+        return (
+            # First match the full path to the file
+            Regex(rb"%s\b" % re.escape(path), b"/file", literal=path),
+            # Then match the directory containing the file
+            Regex(rb"%s\b" % re.escape(path_dir), b"/", literal=path_dir),
+            # Finally, match every hex value (possible offset or address)
+            Regex(rb"0x[0-9a-f]+", b"0x")
+        )
 
     @classmethod
     def cmd_options(cls):
@@ -95,26 +127,27 @@ class ElfSectionCommand(Command):
 
 class ElfCodeSectionCommand(Command):
     @classmethod
+    @lru_cache(maxsize=1024)
     def make_regex(cls, path):
-        regex_list = []
-
-        # Match the full path to the file
-        path = re.escape(path.encode("utf-8"))
-        regex_list.append(Regex(rb"%s\b" % path, b"/file"))
-
-        # Match the leading hex value (offset of the instruction)
-        regex_list.append(Regex(rb"^\s*[0-9a-f]+:\s*", b""))
-
-        # Match addresses that have been resolved to a symbol
-        # First, parse lines that look like:
-        # "callq 4f60 <call_gmon_start>"
-        regex_list.append(Regex(rb"\b([0-9a-f]+)(?=\s+\<\S+\>)", b""))
-
-        # Then, parse lines that look like:
-        # "lea  0x111cb4 (%rip),%rsi     # 12a012 <_fini+0xc4>"
-        regex_list.append(Regex(rb"\b(0x[0-9a-f]+)\b(?=.*\<\S+\>)", b"0x"))
-
-        return regex_list
+        path = path.encode("utf-8")
+
+        # Each pattern is applied to whole blocks of output, which is cheaper
+        # than combining them in a single pattern needing a Python callback
+        # Note: results are cached, so return an immutable tuple
+        return (
+            # Match the full path to the file
+            Regex(rb"%s\b" % re.escape(path), b"/file", literal=path),
+            # Match the leading hex value (offset of the instruction), as well
+            # as the end of the line if nothing follows it
+            Regex(rb"^[^\S\n]*[0-9a-f]+:[^\S\n]*\n?", b"", re.MULTILINE),
+            # Match addresses that have been resolved to a symbol
+            # First, parse lines that look like:
+            # "callq 4f60 <call_gmon_start>"
+            Regex(rb"\b[0-9a-f]+(?=[^\S\n]+\<\S+\>)", b""),
+            # Then, parse lines that look like:
+            # "lea  0x111cb4 (%rip),%rsi     # 12a012 <_fini+0xc4>"
+            Regex(rb"\b0x[0-9a-f]+\b(?=.*\<\S+\>)", b"0x", literal=b"0x")
+        )
 
     @classmethod
     def cmd_options(cls):
@@ -144,13 +177,19 @@ class ElfCodeSectionCommand(Command):
 class ElfFile(UnpackedFile):
     recognize_regex = re.compile(r"^ELF\s")
 
-    # Match section lines in the output of readelf
+    # Match section lines in the output of readelf, and capture their name,
+    # type and flags
+    # Entries of readelf --section-headers have the following columns:
+    # [Nr]  Name  Type  Address  Off  Size  ES  Flg  Lk  Inf  Al
     # Header looks something like "  [ 1]"
-    elf_section_regex = re.compile(r"^\s*\[\s*\d+\]")
+    elf_section_regex = re.compile(
+        rb"^[ \t]*\[[ \t]*\d+\][ \t]+(\S+)[ \t]+(\S+)(?:[ \t]+\S+){4}[ \t]+(\S+)",
+        re.MULTILINE
+    )
 
     # Ignore sections that are not included in this list
     # See https://refspecs.linuxfoundation.org/LSB_2.1.0/LSB-Core-generic/LSB-Core-generic/specialsections.html
-    KEEP_SECTIONS = [
+    KEEP_SECTIONS = frozenset([
         ".rodata",
         ".rodata1",
         ".data",
@@ -164,13 +203,16 @@ class ElfFile(UnpackedFile):
         # Special names for sections with errors
         "<no-strings>",
         "<corrupt>"
-    ]
+    ])
 
     @cached_property
     def fuzzy_hash(self):
         # Compute the hash on the whole file, as it saves time and it's pretty
         # unnecessary to compute the hash on only some sections
-        return compute_fuzzy_hash(self, self.path)
+        return cached(
+            self.config.cache_file, "tlsh:" + self.__class__.__name__, self.path,
+            lambda: compute_fuzzy_hash(self, self.path)
+        )
 
     def has_same_content_as(self, other):
         # For ELF files, since objdump and readelf are pretty slow, first
@@ -186,14 +228,45 @@ class ElfFile(UnpackedFile):
             return True
 
         # Files seem different, but maybe they're not really, so call
-        # readelf and objdump
-        return FileComparator._compare_files(
-            self, self._comparable_path,
-            other, other._comparable_path
-        )
+        # readelf and objdump (on both files at the same time), except for
+        # those already analyzed for a previous comparison
+        compute_comparable_paths([
+            file for file in (self, other)
+            if file._digest_key not in _DIGESTS
+        ])
+
+        return self._comparable_digest() == other._comparable_digest()
 
     @cached_property
     def _comparable_path(self):
+        return self._make_comparable_path()
+
+    @cached_property
+    def _digest_key(self):
+        """
+        Identity of the file's content, as long as it's not modified
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+
+        return (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    @Profiler.profilable
+    def _comparable_digest(self):
+        key = self._digest_key
+        digest = _DIGESTS.get(key)
+
+        if digest is None:
+            digest = compute_digest(self._comparable_path)
+            if key is not None:
+                _DIGESTS[key] = digest
+
+        return digest
+
+    @Profiler.profilable
+    def _make_comparable_path(self):
         # Use readelf and objdump to extract the useful info and write it to
         # a temporary file
         tmp_file_path = FileComparator.tmp_file_path()
@@ -207,9 +280,16 @@ class ElfFile(UnpackedFile):
         if self._analyzer.is_empty():
             return self.path
 
-        with open(tmp_file_path, "wb") as tmp:
-            for line in self._analyzer.run():
-                tmp.write(line)
+        outputs = self._analyzer.run()
+        try:
+            with open(tmp_file_path, "wb") as tmp:
+                for output in outputs:
+                    for block in output:
+                        tmp.write(block)
+        finally:
+            # Commands may not all have been read if writing failed
+            for output in outputs:
+                output.close()
 
         return tmp_file_path
 
@@ -230,22 +310,17 @@ class ElfFile(UnpackedFile):
             "--section-headers",
             file,
         ]
-        output = subprocess.check_output(
-            cmd, shell=False, stderr=subprocess.DEVNULL
-        )
+        output = subprocess.check_output(cmd, stderr=subprocess.DEVNULL)
 
         try:
-            output = output.decode("utf-8").split("\n")
-
-            # Entries of readelf --section-headers have the following columns:
-            # [Nr]  Name  Type  Address  Off  Size  ES  Flg  Lk  Inf  Al
-            for line in output:
-                if not self.elf_section_regex.match(line):
-                    continue
-
-                # Strip number column because there may be spaces in the brakets
-                line = line.split("]", 1)[1].split()
-                name, type, flags = line[0], line[1], line[6]
+            # Stop before the description of flags printed after the sections
+            end = output.find(b"Key to Flags")
+            if end < 0:
+                end = len(output)
+
+            # Scan the raw output once rather than splitting it in lines
+            for match in self.elf_section_regex.finditer(output, 0, end):
+                name, type, flags = (group.decode("utf-8") for group in match.groups())
 
                 if self._should_skip_section(name, type):
                     continue
@@ -19,6 +19,7 @@ from functools import cached_property
 
 from helpers.profiler import Profiler
 from helpers.file_comparator import FileComparator
+from helpers.digest_cache import cached
 from helpers.utils import (
     get_file_type,
     read_timeout,
@@ -36,14 +37,18 @@ class UnpackedFile:
         self._data_folder = data_folder
         self._match = None
 
+        # Files are hashed and compared by relative path as soon as they are
+        # put in sets, so compute these once rather than on every access
+        self.relative_path = path.relative_to(data_folder)
+        self._hash = hash(self.relative_path)
+
     @cached_property
     @Profiler.profilable
     def type(self):
-        return get_file_type(self.path)
-
-    @cached_property
-    def relative_path(self):
-        return self.path.relative_to(self._data_folder)
+        return cached(
+            self.config.cache_file, "type", self.path,
+            lambda: get_file_type(self.path)
+        )
 
     def __repr__(self):
         return "{} {}".format(self.__class__, self.path)
@@ -60,7 +65,7 @@ class UnpackedFile:
         return result
 
     def __hash__(self):
-        return hash(self.relative_path)
+        return self._hash
 
     @classmethod
     @Profiler.profilable
@@ -111,4 +116,9 @@ class UnpackedFile:
 
     @cached_property
     def fuzzy_hash(self):
-        return compute_fuzzy_hash(self, self._comparable_path)
+        # The hash depends on how the comparable content is built, so it is
+        # cached for each class
+        return cached(
+            self.config.cache_file, "tlsh:" + self.__class__.__name__, self.path,
+            lambda: compute_fuzzy_hash(self, self._comparable_path)
+        )
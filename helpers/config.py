@@ -55,6 +55,7 @@ class Config(ConfigParser):
             "clean_extracted": False,
             "statistics": False,
             "profile": False,
+            "cache_file": None,
             "FILE_PATH_1": None,
             "FILE_PATH_2": None
         },
@@ -113,12 +114,29 @@ class Config(ConfigParser):
         elif arg_value is not None:
             value = arg_value
         elif config_value is not None:
-            value = config_value
+            value = self._convert(section, key, config_value, default_value)
         else:
             value = default_value
 
         self._set(section, key, value)
 
+    def _convert(self, section, key, config_value, default_value):
+        """
+        Convert a value read from the config file (always a string) to the
+        type of its default value, so attributes always hold native values
+        """
+        # bool is checked first, as it is a subclass of int
+        if isinstance(default_value, bool):
+            return self.getboolean(section, key)
+        elif isinstance(default_value, int):
+            return self.getint(section, key)
+        elif isinstance(default_value, float):
+            return self.getfloat(section, key)
+        elif isinstance(default_value, pathlib.Path):
+            return pathlib.Path(config_value)
+
+        return config_value
+
     def _set(self, section, key, value):
         # Values from the "diff" section are also stored as arguments
         # for convenience
@@ -182,6 +200,7 @@ def setup_argparser(name, description, command_line_options):
     parser.add_argument("--clean-extracted", action="store_true", help="Delete temporary container files which have been extracted", default=None)
     parser.add_argument("--enable-statistics", action="store_true", dest="statistics", help="Compute statistics or check for unpack data loss", default=None)
     parser.add_argument("--profile", action="store_true", help="Measure the number of calls and time spent in different methods", default=False)
+    parser.add_argument("--cache-file", help="Path to a file in which to keep fuzzy hashes and file types between runs (for unchanged files)", default=None)
 
     parser.add_argument("FILE_PATH_1", type=str, help="Path to first file")
     parser.add_argument("FILE_PATH_2", type=str, help="Path to second file")
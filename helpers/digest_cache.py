@@ -0,0 +1,125 @@
+"""
+Copyright (C) 2020 Airbus
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+import json
+import sqlite3
+import threading
+import multiprocessing.util
+from stat import S_ISLNK
+
+
+# Connections can't be shared between processes, so each one opens its own,
+# which its threads share
+_connections = {}
+_lock = threading.Lock()
+
+
+def _reset_lock():
+    # A thread of the parent may have held the lock while it forked
+    global _lock
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_lock)
+
+
+def _connect(cache_file):
+    key = (os.getpid(), cache_file)
+    connection = _connections.get(key)
+    if connection is None:
+        if not any(pid == key[0] for pid, _ in _connections):
+            # Run when this process exits, including processes from pools
+            # (which don't run atexit handlers) as long as they aren't
+            # terminated
+            multiprocessing.util.Finalize(None, close_connections, exitpriority=0)
+
+        connection = sqlite3.connect(
+            cache_file,
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        # Processes looking for moved files write to the cache concurrently
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT)")
+        _connections[key] = connection
+
+    return connection
+
+
+def close_connections():
+    """
+    Close the connections opened by this process
+    Connections inherited from a parent process are left alone, as they
+    still belong to it
+    """
+    with _lock:
+        pid = os.getpid()
+        for key in [key for key in _connections if key[0] == pid]:
+            _connections.pop(key).close()
+
+
+def cached(cache_file, kind, path, compute):
+    """
+    Return the value of the given kind cached for the file at the given path,
+    or call compute and store its result in the cache
+    Entries are keyed by path, modification time and size, so they're ignored
+    once the file (or the target of a symlink) changes
+    Setting cache_file to None disables the cache
+    """
+    if not cache_file:
+        return compute()
+
+    # The path itself is used (symlinks aren't followed), as that's what types
+    # describe: a retargeted link gets a new modification time
+    try:
+        stat = os.lstat(path)
+    except OSError:
+        # Files removed since...
+        return compute()
+
+    key = "{}:{}:{}:{}".format(
+        kind,
+        os.path.abspath(path),
+        stat.st_mtime_ns,
+        stat.st_size
+    )
+
+    # Fuzzy hashes of links are computed on their targets' contents, so these
+    # must not have changed either
+    if S_ISLNK(stat.st_mode):
+        try:
+            target = os.stat(path)
+            key += ":{}:{}".format(target.st_mtime_ns, target.st_size)
+        except OSError:
+            # Broken symlink
+            pass
+
+    with _lock:
+        connection = _connect(cache_file)
+        row = connection.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+    if row is not None:
+        return json.loads(row[0])
+
+    # Not locked, so that threads compute values concurrently
+    value = compute()
+    with _lock:
+        connection = _connect(cache_file)
+        connection.execute("INSERT OR REPLACE INTO cache VALUES (?, ?)", (key, json.dumps(value)))
+    return value
@@ -14,19 +14,49 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+import os
 import tempfile
-import subprocess
+import itertools
 
 from .utils import get_file_size
 
 
+# Size of the chunks read when comparing the content of two files
+CHUNK_SIZE = 131072
+
+# Size of the beginning of large files, compared before reading whole chunks
+PREFIX_SIZE = 4096
+
+# Buffers reused for every comparison made in this process, so they don't have
+# to be allocated each time
+_buffer1 = bytearray(CHUNK_SIZE)
+_buffer2 = bytearray(CHUNK_SIZE)
+_prefix1 = memoryview(_buffer1)[:PREFIX_SIZE]
+_prefix2 = memoryview(_buffer2)[:PREFIX_SIZE]
+
+
+def _advise_sequential(file):
+    """
+    Tell the kernel the given file will be read sequentially, so it reads ahead
+    larger blocks (only available on some platforms)
+    """
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+
 class FileComparator:
     """
     Class comparing two given files, and handling temporary file paths generated
     for this comparison
     """
+    # Created in the default temporary folder: comparable files may be large
+    # and are only removed on cleanup, so they shouldn't fill up memory. Set
+    # TMPDIR to a tmpfs (e.g. /dev/shm) to keep them in memory anyway
     TMP_DIR = tempfile.TemporaryDirectory(prefix="diffware_")
 
+    # Used to name temporary files, as next() on a count is atomic
+    _tmp_counter = itertools.count()
+
     @staticmethod
     def are_equal(file1, file2):
         # Specialized files may have custom implementations of compare, so
@@ -50,18 +80,56 @@ class FileComparator:
         if file1_size != file2_size:
             return False
 
-        if file1_size == file2_size and file2_size <= 65536:
-            # Compare small files directly
+        if file1_size == 0:
+            # Either empty files, or special files (devices, fifos...) which
+            # may block and should only be read with a timeout
             file1_content = b"".join(file1._read(path1))
             file2_content = b"".join(file2._read(path2))
             return file1_content == file2_content
 
-        # Call an external diff otherwise
-        return subprocess.call(
-            ("cmp", "-s", path1, path2),
-            shell=False,
-            close_fds=True,
-        ) == 0
+        return FileComparator._compare_chunks(path1, path2, file1_size)
+
+    @staticmethod
+    def _compare_chunks(path1, path2, size):
+        """
+        Compare the contents of the given files chunk by chunk, and stop as soon
+        as a difference is found
+        This is done in-process as forking a cmp process costs more than reading
+        moderately sized files
+        """
+        with open(path1, "rb", buffering=0) as f1, open(path2, "rb", buffering=0) as f2:
+            if size <= CHUNK_SIZE:
+                # Small files are read at once, which is cheaper than filling
+                # the buffers and slicing them
+                return f1.read(size) == f2.read(size)
+
+            # Files spanning multiple chunks are read in several syscalls,
+            # so make sure they are not slowed down by a cold cache
+            _advise_sequential(f1)
+            _advise_sequential(f2)
+
+            # Most files which are different already differ in their first
+            # page, so check it before reading whole chunks
+            f1.readinto(_prefix1)
+            f2.readinto(_prefix2)
+            if _buffer1[:PREFIX_SIZE] != _buffer2[:PREFIX_SIZE]:
+                return False
+
+            while True:
+                size1 = f1.readinto(_buffer1)
+                size2 = f2.readinto(_buffer2)
+
+                if size1 != size2:
+                    return False
+
+                if size1 < CHUNK_SIZE:
+                    # Last chunk, only part of the buffers was filled
+                    return _buffer1[:size1] == _buffer2[:size2]
+
+                # Note: comparing bytearrays relies on memcmp, whereas comparing
+                # memoryviews is done byte by byte
+                if _buffer1 != _buffer2:
+                    return False
 
     @classmethod
     def tmp_file_path(cls):
@@ -69,7 +137,11 @@ class FileComparator:
         Used to create a temporary file that should be cleaned up after the
         script is done (remember to call cleanup)
         """
-        return tempfile.mktemp(dir=cls.TMP_DIR.name)
+        # The folder is private and shared by worker processes, so the pid and
+        # a counter are enough to get unique names without locking or calling
+        # stat like tempfile.mktemp does
+        name = "{}_{}".format(os.getpid(), next(cls._tmp_counter))
+        return os.path.join(cls.TMP_DIR.name, name)
 
     @classmethod
     def cleanup(cls):
@@ -14,15 +14,73 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
-import random
+import sys
 import operator
+import itertools
 import multiprocessing
 from functools import cached_property
 
 import files
 from .logger import Logger
 from .profiler import Profiler
-from .utils import compute_distance
+from .utils import (
+    compute_distance,
+    compute_distances,
+    fuzzy_hash_length,
+    fuzzy_length_distance
+)
+
+
+# Below this number of distances to compute, looking for moved files is faster
+# than starting a pool of processes to do it
+SERIAL_MATCH_THRESHOLD = 2000
+
+# Comparator and missing files used by the processes looking for moved files.
+# They are given once when each process starts, so only indexes have to be
+# sent for each file
+_match_worker_state = None
+
+
+def _pool_context():
+    """
+    Return the multiprocessing context used to look for moved files
+    Forked processes inherit the state of the parent (fuzzy hashes, index of
+    new files...) rather than receiving a copy of it, so fork is used whatever
+    the default start method is, except where it's unavailable (Windows) or
+    unsafe (macOS)
+    """
+    if sys.platform != "darwin":
+        try:
+            return multiprocessing.get_context("fork")
+        except ValueError:
+            pass
+
+    return multiprocessing.get_context("spawn")
+
+
+def _init_match_worker(comparator, files, show_progress):
+    global _match_worker_state
+    _match_worker_state = (comparator, files)
+    # Spawned processes don't inherit the logging setup of the parent
+    Logger.SHOW_PROGRESS = show_progress
+
+
+def _fuzzy_hash_in_worker(index):
+    _, files = _match_worker_state
+    return files[index].fuzzy_hash
+
+
+def _match_file_in_worker(index):
+    """
+    Match the file at the given index, and return the relative path of the
+    matched file (rather than the file itself, to send less data back)
+    """
+    comparator, files = _match_worker_state
+    match = comparator._match_file(files[index])
+    if match is None:
+        return None
+
+    return match.relative_path
 
 
 class FilesetComparator:
@@ -32,9 +90,10 @@ class FilesetComparator:
     """
     @Profiler.profilable
     def __init__(self, files1, files2, config):
-        # Converting to set triggers the call to the generators
-        self.file_set1 = set(files1)
-        self.file_set2 = set(files2)
+        # Converting to set triggers the call to the generators (sets given
+        # directly are kept as is, they are never modified here)
+        self.file_set1 = self._as_set(files1)
+        self.file_set2 = self._as_set(files2)
         self.config = config
 
     ### Accessible properties
@@ -87,8 +146,7 @@ class FilesetComparator:
         Returns a list of removed files than were not found to be moved
         """
         # Get only the original files (aka from file1) that were moved
-        moved = map(lambda pair: pair[0], self.moved_file_pairs)
-        return self._missing_files - set(moved)
+        return self._missing_files - {pair[0] for pair in self.moved_file_pairs}
 
     @cached_property
     def added_files(self):
@@ -97,8 +155,7 @@ class FilesetComparator:
         older removed files
         """
         # Get only the target files (aka from file2) that were moved
-        moved = map(lambda pair: pair[1], self.moved_file_pairs)
-        return self._new_files - set(moved)
+        return self._new_files - {pair[1] for pair in self.moved_file_pairs}
 
     @cached_property
     @Profiler.profilable
@@ -112,8 +169,36 @@ class FilesetComparator:
         moved = []
         files = list(self._missing_files)
 
-        with multiprocessing.Pool(self.config.jobs) as pool:
-            matched = pool.map(self._match_file, files)
+        if not files or not self._new_files:
+            return moved
+
+        # Only files which may be moved need to be specialized here, as
+        # classes must match for files to be considered similar
+        self._specialize(itertools.chain(files, self._new_files))
+
+        if len(files) * len(self._new_files) < SERIAL_MATCH_THRESHOLD:
+            matched = list(map(self._match_file, files))
+        else:
+            context = _pool_context()
+            self._compute_fuzzy_hashes(context, itertools.chain(files, self._new_files))
+
+            # Build the index here, so processes get it with the hashes
+            # (inherited when forked, or sent along with the comparator)
+            self._new_files_index
+
+            with context.Pool(
+                self.config.jobs,
+                initializer=_init_match_worker,
+                initargs=(self, files, Logger.SHOW_PROGRESS)
+            ) as pool:
+                paths = pool.map(_match_file_in_worker, range(len(files)))
+                # Let processes exit by themselves (rather than being
+                # terminated), so they close their cache connections
+                pool.close()
+                pool.join()
+
+            new_files = {f.relative_path: f for f in self._new_files}
+            matched = [new_files.get(path) for path in paths]
 
         for i in range(len(matched)):
             if matched[i] is not None:
@@ -129,17 +214,29 @@ class FilesetComparator:
     def compute_distance(file1, file2):
         return compute_distance(file1, file2)
 
+    @staticmethod
+    @Profiler.profilable
+    def compute_distances(file, others):
+        return compute_distances(file, others)
+
     ### Internal methods
 
+    @staticmethod
+    def _as_set(files):
+        if isinstance(files, (set, frozenset)):
+            return files
+        return set(files)
+
     def _get_matching_pairs(self):
         """
         Returns a list of pair of files to be compared
         """
         def generator():
             for file in self._common_files:
-                # The matched file may not have been specialized yet
+                # Files are only specialized once they are actually compared
+                file1 = self._specialize_file(file)
                 file2 = self._specialize_file(file._match)
-                yield (file, file2)
+                yield (file1, file2)
 
             yield from self.moved_file_pairs
 
@@ -147,33 +244,114 @@ class FilesetComparator:
 
     @cached_property
     @Profiler.profilable
+    def _partition(self):
+        """
+        Split files into those with the same paths in both sets, those which
+        only exist in the first set and those which only exist in the second,
+        with a single lookup per file
+        """
+        Logger.progress("Finding files in common...")
+        # Matched files are removed from the index of file_set2, so what's
+        # left in the end are the new files
+        files2 = {file: file for file in self.file_set2}
+        common = set()
+        missing = set()
+
+        for file in self.file_set1:
+            match = files2.pop(file, None)
+            if match is None:
+                missing.add(file)
+            else:
+                file._match = match
+                match._match = file
+                common.add(file)
+
+        return common, missing, set(files2)
+
+    @property
     def _common_files(self):
         """
         Return files with the same paths in both sets
         """
-        Logger.progress("Finding files in common...")
-        # Do this in 2 steps (rather than using .intersection) to make
-        # sure the elements we get are from file_set1
-        diff = self.file_set1 - self.file_set2
-        return self._specialize(self.file_set1 - diff)
+        return self._partition[0]
 
-    @cached_property
-    @Profiler.profilable
+    @property
     def _missing_files(self):
         """
         Return files which exist in the first set but not the second
         """
-        Logger.progress("Finding missing files...")
-        return self._specialize(self.file_set1 - self._common_files)
+        return self._partition[1]
 
-    @cached_property
-    @Profiler.profilable
+    @property
     def _new_files(self):
         """
         Return files which exist in the second set but not the first
         """
-        Logger.progress("Finding new files...")
-        return self._specialize(self.file_set2 - self._common_files)
+        return self._partition[2]
+
+    def _compute_fuzzy_hashes(self, context, file_list):
+        """
+        Compute the fuzzy hashes of the given files in parallel (in processes
+        from the given multiprocessing context), and store them
+        in this process so that processes started afterwards get them rather
+        than computing them again
+        """
+        pending = [f for f in file_list if "fuzzy_hash" not in vars(f)]
+        if not pending:
+            return
+
+        with context.Pool(
+            self.config.jobs,
+            initializer=_init_match_worker,
+            initargs=(None, pending, Logger.SHOW_PROGRESS)
+        ) as pool:
+            hashes = pool.map(_fuzzy_hash_in_worker, range(len(pending)))
+            pool.close()
+            pool.join()
+
+        # Fill the cached_property values directly
+        for file, fuzzy_hash in zip(pending, hashes):
+            file.fuzzy_hash = fuzzy_hash
+
+    @cached_property
+    def _new_files_index(self):
+        """
+        New files grouped by the length value of their fuzzy hash, as files
+        with lengths too far apart can't be close enough to match
+        Files without a usable fuzzy hash are grouped under None
+        """
+        index = {}
+        for file in self._new_files:
+            length = None
+            if file.fuzzy_hash:
+                length = fuzzy_hash_length(file.fuzzy_hash)
+            index.setdefault(length, []).append(file)
+
+        return index
+
+    def _get_candidates(self, file):
+        """
+        Return the new files which may be close enough to match the given file
+        """
+        length = None
+        if file.fuzzy_hash:
+            length = fuzzy_hash_length(file.fuzzy_hash)
+
+        if length is None:
+            # The distance will be computed without fuzzy hashes, so any
+            # file could match
+            return list(self._new_files)
+
+        # Distances with files without a fuzzy hash are computed another way
+        candidates = list(self._new_files_index.get(None, []))
+        for other_length, bucket in self._new_files_index.items():
+            if other_length is None:
+                continue
+
+            if fuzzy_length_distance(length, other_length) < self.config.fuzzy_threshold:
+                candidates.extend(bucket)
+
+        return candidates
 
     @classmethod
     def _files_classes_match(cls, file1, file2):
@@ -185,46 +363,40 @@ class FilesetComparator:
         Match the given file with another file from the given set, if they
         are similar enough
         """
-        Logger.progress("Looking for moved {}...".format(file.path))
+        if Logger.SHOW_PROGRESS:
+            Logger.progress("Looking for moved {}...".format(file.path))
 
         if file_set is None:
-            file_set = list(self._new_files)
-
-        # Randomize the order in which the files are iterated so multithreading
-        # doesn't compute the fuzzy_hash of the same file multiple times
-        # in parallel, rendering the cache useless
-        random.shuffle(file_set)
-
-        comparisons = []
-        for f in file_set:
-            if not self._files_classes_match(file, f):
-                continue
-            score = type(self).compute_distance(file, f)
-            comparisons.append((score, f))
+            file_set = self._get_candidates(file)
 
-        if not comparisons:
+        candidates = [f for f in file_set if self._files_classes_match(file, f)]
+        if not candidates:
             return None
 
-        comparisons.sort(key=operator.itemgetter(0))
-        best_score, closest_file = comparisons[0]
+        # Compute all the distances at once, which is faster than one by one
+        scores = type(self).compute_distances(file, candidates)
+
+        # Only the closest file is needed, no need to sort all of them
+        best_score, closest_file = min(
+            zip(scores, candidates),
+            key=operator.itemgetter(0)
+        )
         if best_score < self.config.fuzzy_threshold:
             return closest_file
 
         return None
 
-    def _specialize(self, file_set):
+    def _specialize(self, file_list):
         """
-        Specializes all the files in the given set
+        Specializes all the given files (instances are cast in place)
         """
         if not self.config.specialize:
-            return file_set
-
-        specialized_set = set()
-        for file in file_set:
-            Logger.progress("Specializing {}...".format(file.path))
-            specialized_set.add(self._specialize_file(file))
+            return
 
-        return specialized_set
+        for file in file_list:
+            if Logger.SHOW_PROGRESS:
+                Logger.progress("Specializing {}...".format(file.path))
+            self._specialize_file(file)
 
     def _specialize_file(self, file):
         """
@@ -233,9 +405,8 @@ class FilesetComparator:
         if not self.config.specialize:
             return file
 
-        for file_class in files.FILE_TYPES:
-            if file_class.recognizes(file.type):
-                file.__class__ = file_class
-                break
+        file_class = files.recognize(file.type)
+        if file_class is not None:
+            file.__class__ = file_class
 
         return file
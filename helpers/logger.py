@@ -16,6 +16,7 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import os
 import sys
+import time
 import logging
 
 try:
@@ -41,9 +42,19 @@ class CustomFormatter(logging.Formatter):
         logging.CRITICAL: bold_red + "[CRITICAL] %(message)s" + reset
     }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Build formatters once rather than for each record
+        self.formatters = {
+            level: logging.Formatter(log_fmt)
+            for level, log_fmt in self.FORMATS.items()
+        }
+
     def format(self, record):
-        log_fmt = self.FORMATS.get(record.levelno)
-        formatter = logging.Formatter(log_fmt)
+        formatter = self.formatters.get(record.levelno)
+        if formatter is None:
+            # Unknown levels only get the message
+            return super().format(record)
         return formatter.format(record)
 
 
@@ -52,11 +63,17 @@ class Logger():
     LOGGING_LEVEL = logging.INFO
     OUTPUT_FILE = None
     SHOW_PROGRESS = True
+    # Format making progress lines take up exactly the terminal width
+    # Computed again every PROGRESS_REFRESH seconds, to follow terminal resizes
+    PROGRESS_FORMAT = None
+    PROGRESS_FORMAT_TIME = 0
+    PROGRESS_REFRESH = 1
 
     @staticmethod
     def setup_logging(debug=False, progress=True, log_level=logging.WARNING, output_file="-"):
         Logger.DEBUG = debug
         Logger.SHOW_PROGRESS = progress
+        Logger.PROGRESS_FORMAT = None
         Logger.LOGGING_LEVEL = logging.DEBUG if debug else log_level
         if output_file != "-":
             Logger.OUTPUT_FILE = open(output_file, "w")
@@ -131,6 +148,15 @@ class Logger():
         if not Logger.SHOW_PROGRESS:
             return
 
+        now = time.monotonic()
+        if Logger.PROGRESS_FORMAT is None or now - Logger.PROGRESS_FORMAT_TIME > Logger.PROGRESS_REFRESH:
+            Logger.PROGRESS_FORMAT = Logger._make_progress_format()
+            Logger.PROGRESS_FORMAT_TIME = now
+
+        print(Logger.PROGRESS_FORMAT.format(string), end="\r")
+
+    @staticmethod
+    def _make_progress_format():
         # Make string take up exactly full width
         try:
             max_size = os.get_terminal_size()[0]
@@ -138,5 +164,4 @@ class Logger():
             # Probably redirecting output to file or process
             max_size = 128
 
-        format = "\033[2m{:<" + str(max_size) + "." + str(max_size) + "}\033[0m"
-        print(format.format(string), end="\r")
+        return "\033[2m{:<" + str(max_size) + "." + str(max_size) + "}\033[0m"
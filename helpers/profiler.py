@@ -65,15 +65,17 @@ class Profiler():
 
     @classmethod
     def profilable(cls, func):
+        # PROFILING_ENABLED is only set once the arguments are parsed, after
+        # functions are decorated, so it has to be checked for each call
         @wraps(func)
         def wrapper(*args, **kwargs):
             if not cls.PROFILING_ENABLED:
                 return func(*args, **kwargs)
 
             # Measure the time spent for the call, and update the stats
-            start = time.time()
+            start = time.perf_counter()
             value = func(*args, **kwargs)
-            end = time.time()
+            end = time.perf_counter()
             cls.record_time(func.__qualname__, start, end)
             return value
 
@@ -15,12 +15,12 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import os
+import re
 import sys
 import shutil
 import pathlib
 import fnmatch
 from copy import deepcopy
-from functools import lru_cache
 
 try:
     # Try to import fact_extractor if possible, otherwise
@@ -39,6 +39,17 @@ from .logger import Logger
 from .utils import get_file_type, read_list_from_config
 
 
+def _compile_globs(patterns):
+    """
+    Compile the given glob patterns into a single regex matching any of them,
+    or return None if there are none
+    """
+    if not patterns:
+        return None
+
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns))
+
+
 def _copy_if_necessary(file_path, source_folder, destination_folder):
     """
     Copy the given file to the output folder, if it's not already there
@@ -103,7 +114,9 @@ class Runner:
     def __init__(self, config):
         self.config = config
         self.excluded = read_list_from_config(config, "unpack", "exclude") or []
+        self._excluded_regex = _compile_globs(self.excluded)
         self.excluded_mimes = config.exclude_mime
+        self._excluded_mimes_regex = _compile_globs(self.excluded_mimes)
 
         if config.extract and not FACT_FOUND:
             raise ModuleNotFoundError(
@@ -193,20 +206,17 @@ class Runner:
 
     ### Helper methods
 
-    @lru_cache(maxsize=128, typed=False)
     def _is_mime_excluded(self, mime_type):
-        for pattern in self.excluded_mimes:
-            if fnmatch.fnmatchcase(mime_type, pattern):
-                return True
+        # All patterns are checked at once
+        return self._excluded_mimes_regex.match(mime_type) is not None
 
     def is_excluded(self, path):
-        for pattern in self.excluded:
-            if fnmatch.fnmatchcase(str(path), pattern):
-                Logger.debug("Ignoring file {}".format(path))
-                return True
+        if self._excluded_regex is not None and self._excluded_regex.match(str(path)):
+            Logger.debug("Ignoring file {}".format(path))
+            return True
 
         # Don't find mime type if there is no rule to exclude it
-        if self.excluded_mimes:
+        if self._excluded_mimes_regex is not None:
             mime_type = get_file_type(path)["mime"]
             if self._is_mime_excluded(mime_type):
                 Logger.debug("Ignoring file {} with mime-type {}".format(path, mime_type))
@@ -231,7 +241,7 @@ class Runner:
         if config.max_depth >= 0 and depth > config.max_depth:
             Logger.warn("Max recursion depth reached, skipping {}".format(file_path))
             should_skip = True
-        else:
+        elif Logger.SHOW_PROGRESS:
             Logger.progress("Unpacking {}...".format(file_path))
 
         # Symlinks shouln't be followed
@@ -271,11 +281,43 @@ class Runner:
     def _walk(self, file_path):
         """
         Generator to walk the files included in a directory
+        Like os.walk, symlinks to directories are neither followed nor
+        returned, and directories which can't be listed are ignored
         """
-        for root, _, files in os.walk(file_path):
-            for name in files:
-                file = pathlib.Path(root, name)
-
-                Logger.progress("Walking {}...".format(file))
-                if not self.is_excluded(file):
-                    yield file
+        # Directories left to walk, the next one to walk being last
+        directories = [file_path]
+        while directories:
+            try:
+                entries = os.scandir(directories.pop())
+            except OSError:
+                continue
+
+            file_paths = []
+            subdirectories = []
+            try:
+                with entries:
+                    for entry in entries:
+                        # Entries cache the file type found while listing the
+                        # directory, so this usually doesn't need a stat
+                        try:
+                            is_dir = entry.is_dir()
+                        except OSError:
+                            is_dir = False
+
+                        if not is_dir:
+                            file_paths.append(entry.path)
+                        elif not entry.is_symlink():
+                            subdirectories.append(entry.path)
+            except OSError:
+                # Like os.walk, skip directories which fail while being listed
+                continue
+
+            for path in file_paths:
+                # Checked here so messages aren't even formatted when hidden
+                if Logger.SHOW_PROGRESS:
+                    Logger.progress("Walking {}...".format(path))
+                if not self.is_excluded(path):
+                    yield pathlib.Path(path)
+
+            # Walk subdirectories in the order they were listed
+            directories.extend(reversed(subdirectories))
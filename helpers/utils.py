@@ -16,9 +16,10 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import os
 import tlsh
+import hashlib
 import signal
 import pathlib
-import subprocess
+from functools import lru_cache
 from configparser import NoOptionError, NoSectionError
 
 try:
@@ -33,6 +34,28 @@ from .logger import Logger
 
 
 def get_file_type(path):
+    """
+    Return the type of the file at the given path
+    Types are cached by path, inode, modification time and size, as the same
+    file is usually checked while walking (to exclude mime types) and then
+    again when it is specialized
+    """
+    # Symlinks aren't followed, as their type describes the link itself
+    try:
+        stat = os.lstat(path)
+    except OSError:
+        # Files removed since...
+        return _get_file_type(path)
+
+    return _get_cached_file_type(str(path), stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=65536)
+def _get_cached_file_type(path, inode, mtime, size):
+    return _get_file_type(path)
+
+
+def _get_file_type(path):
     path = pathlib.Path(path)
 
     # Make sure symlinks aren't followed
@@ -95,25 +118,111 @@ def read_timeout(file_handle, bytes=1024, timeout=0):
     return data
 
 
+# Fuzzy hashes already computed, so files with the same content are only
+# hashed once. Digests are only computed for files which have the same size as
+# another one, as others can't have the same content
+_fuzzy_hashes_by_size = {}
+_fuzzy_hashes_by_digest = {}
+
+
 def compute_fuzzy_hash(file, path):
     """
     Compute the fuzzy hash of the given file
     cf diffoscope/comparators/utils/file.py
     """
-    # tlsh is not meaningful with files smaller than 512 bytes
-    if get_file_size(path) >= 512:
-        h = tlsh.Tlsh()
-        for buf in file._read(path):
-            h.update(buf)
-        h.final()
+    size = get_file_size(path)
 
+    # tlsh is not meaningful with files smaller than 512 bytes
+    if size < 512:
+        return None
+
+    first = _fuzzy_hashes_by_size.get(size)
+    if first is None:
+        # First file with this size, remember it in case another one follows
+        fuzzy_hash = _compute_tlsh(file, path)
+        _fuzzy_hashes_by_size[size] = (path, fuzzy_hash)
+        return fuzzy_hash
+
+    first_path, first_hash = first
+    if first_path is not None:
+        # A second file has this size, so digests are now needed for both
+        _fuzzy_hashes_by_size[size] = (None, None)
         try:
-            return h.hexdigest()
-        except ValueError:
-            # File must contain a certain amount of randomness.
-            return None
+            first_key = (size, compute_digest(first_path))
+            _fuzzy_hashes_by_digest[first_key] = first_hash
+        except OSError:
+            # The first file may have been removed since
+            pass
+
+    key = (size, compute_digest(path))
+    if key not in _fuzzy_hashes_by_digest:
+        _fuzzy_hashes_by_digest[key] = _compute_tlsh(file, path)
+
+    return _fuzzy_hashes_by_digest[key]
+
+
+def _compute_tlsh(file, path):
+    h = tlsh.Tlsh()
+    for buf in file._read(path):
+        h.update(buf)
+    h.final()
+
+    try:
+        return h.hexdigest()
+    except ValueError:
+        # File must contain a certain amount of randomness.
+        return None
+
+
+def compute_digest(path, chunk_size=131072):
+    """
+    Compute a digest of the content of the file at the given path
+    """
+    h = hashlib.blake2b(digest_size=16)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+
+    with open(path, "rb", buffering=0) as f:
+        for size in iter(lambda: f.readinto(buffer), 0):
+            h.update(view[:size])
+
+    return h.digest()
+
+
+# Range of the length value encoded in TLSH hashes (distances wrap around)
+TLSH_LENGTH_RANGE = 256
 
-    return None
+
+def fuzzy_hash_length(fuzzy_hash):
+    """
+    Return the length value encoded in the header of the given TLSH hash, or
+    None if it isn't a valid hash
+    """
+    if len(fuzzy_hash) == 72:
+        # Remove the version prefix ("T1")
+        fuzzy_hash = fuzzy_hash[2:]
+
+    if len(fuzzy_hash) != 70:
+        return None
+
+    # The header starts with the checksum, then the length, each byte being
+    # stored with swapped nibbles
+    value = int(fuzzy_hash[2:4], 16)
+    return ((value & 0xf) << 4) | (value >> 4)
+
+
+def fuzzy_length_distance(length1, length2):
+    """
+    Part of the TLSH distance coming from the length values of two hashes,
+    which is a lower bound of their whole distance
+    cf tlsh_impl.cpp (TlshImpl::totalDiff)
+    """
+    diff = abs(length1 - length2)
+    diff = min(diff, TLSH_LENGTH_RANGE - diff)
+
+    if diff <= 1:
+        return diff
+    return diff * 12
 
 
 def compute_distance(file1, file2):
@@ -130,20 +239,76 @@ def compute_distance(file1, file2):
     # Compute the proportion of bytes changed
     path1 = str(file1.path)
     path2 = str(file2.path)
-    file_size = max(get_file_size(path1), get_file_size(path2))
+    size1 = get_file_size(path1)
+    size2 = get_file_size(path2)
+    file_size = max(size1, size2)
 
     try:
-        diff_bytes = subprocess.check_output(["cmp", "-l", path1, path2], stderr=subprocess.DEVNULL)
-    except subprocess.CalledProcessError as e:
-        # When files are different, cmp has an exit code of 1
-        diff_bytes = e.output
+        diff_count = count_different_bytes(path1, path2)
+    except OSError:
+        # Unreadable files, broken symlinks...
+        diff_count = 0
+
+    # This used to be the size of the output of "cmp -l", which has one line
+    # per different byte: its offset (padded to the number of digits of the
+    # smallest size), and both values as 3 octal digits
+    line_length = len(str(min(size1, size2))) + 9
 
     # Diff is size of output, multiplied by a constant to be the same order of
     # magnitude as TLSH's distance, and set at a min value of 1
-    diff = int(10 * len(diff_bytes) / max(1, file_size))
+    diff = int(10 * diff_count * line_length / max(1, file_size))
     return max(diff, 1)
 
 
+def count_different_bytes(path1, path2, chunk_size=131072):
+    """
+    Count the bytes which differ between the files at the given paths, up to
+    the end of the smallest one (like "cmp -l" does)
+    """
+    count = 0
+
+    with open(path1, "rb", buffering=0) as f1, open(path2, "rb", buffering=0) as f2:
+        while True:
+            chunk1 = f1.read(chunk_size)
+            chunk2 = f2.read(chunk_size)
+            size = min(len(chunk1), len(chunk2))
+            if size == 0:
+                break
+
+            if chunk1[:size] != chunk2[:size]:
+                # XOR both chunks as integers, so bytes which are equal become
+                # zeros which can be counted without a Python loop
+                xor = int.from_bytes(chunk1[:size], "little") ^ int.from_bytes(chunk2[:size], "little")
+                count += size - xor.to_bytes(size, "little").count(0)
+
+            if len(chunk1) != len(chunk2):
+                break
+
+    return count
+
+
+def compute_distances(file, others):
+    """
+    Compute the distances between the given file and each of the others, like
+    compute_distance would, but without its overhead for each pair
+    """
+    distances = []
+    fuzzy_hash = file.fuzzy_hash
+
+    for other in others:
+        other_hash = other.fuzzy_hash
+        if fuzzy_hash and other_hash:
+            try:
+                distances.append(tlsh.diff(fuzzy_hash, other_hash))
+                continue
+            except ValueError:
+                pass
+
+        distances.append(compute_distance(file, other))
+
+    return distances
+
+
 def read_list_from_config(config_file, section, key, fallback=None):
     """
     Inspired by https://github.com/fkie-cad/fact_extractor/blob/master/fact_extractor/helperFunctions/config.py
@@ -76,7 +76,8 @@ def _compare(config, delay_output, pair):
     or too similar, or a tuple of (path1, path2, distance) otherwise
     """
     file1, file2 = pair
-    Logger.progress("Comparing {} and {}...".format(file1.relative_path, file2.relative_path))
+    if Logger.SHOW_PROGRESS:
+        Logger.progress("Comparing {} and {}...".format(file1.relative_path, file2.relative_path))
 
     if FileComparator.are_equal(file1, file2):
         return
@@ -136,6 +137,10 @@ def compare_files(file_set1, file_set2, data_folder_1, data_folder_2, config):
     with multiprocessing.Pool(config.jobs, initializer=_init_process, initargs=(lock,)) as pool:
         edits = pool.map(func, pairs)
         edits = [edit for edit in edits if edit is not None]
+        # Let processes exit by themselves (rather than being terminated), so
+        # they close their cache connections
+        pool.close()
+        pool.join()
 
     # If necessary, sort and then output the result
     Logger.progress("Generating output...")
@@ -0,0 +1,57 @@
+"""
+Copyright (C) 2020 Airbus
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import io
+import re
+
+import files.analyzer
+from files.analyzer import Command, Regex
+
+
+def test_filter_keeps_lines_whole(monkeypatch):
+    # Use blocks smaller than a line, so lines span several reads
+    monkeypatch.setattr(files.analyzer, "FILTER_BLOCK_SIZE", 5)
+    output = io.BytesIO(b"0x1234 first line\n0x5678 second line\nlast")
+    regex = [Regex(rb"^0x[0-9a-f]+ ", b"", re.MULTILINE)]
+
+    filtered = b"".join(Command._filter(output, regex))
+
+    assert filtered == b"first line\nsecond line\nlast"
+
+
+class SleepCommand(Command):
+    @classmethod
+    def make_cmd(cls, file, config):
+        return ["sleep", "10"]
+
+
+def test_close_unread_output():
+    output = SleepCommand.run("unused", None)
+    output.close()
+
+    assert output._process.returncode is not None
+    assert output._stderr.closed
+
+
+class EmptyCommand(Command):
+    @classmethod
+    def make_cmd(cls, file, config):
+        return None
+
+
+def test_close_empty_output():
+    with EmptyCommand.run("unused", None) as output:
+        assert list(output) == []
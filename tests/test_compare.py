@@ -14,9 +14,12 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+import os
+import multiprocessing
 import pytest
 
 from .utils import get_files, make_config
+import helpers.fileset_comparator
 from helpers.fileset_comparator import FilesetComparator
 from files.generic import UnpackedFile
 from files.symlink import SymlinkFile
@@ -84,3 +87,43 @@ def test_compare_no_matching(config, path1, path2):
     assert len(pairs) == 1
     assert len(comparator.added_files) == 1
     assert len(comparator.removed_files) == 1
+
+
+@pytest.mark.parametrize("serial, fork", [(True, True), (False, True), (False, False)])
+def test_compare_moved(config, tmp_path, monkeypatch, serial, fork):
+    if not serial:
+        monkeypatch.setattr(helpers.fileset_comparator, "SERIAL_MATCH_THRESHOLD", 0)
+    if not fork:
+        # Platforms where processes can't be forked spawn them instead
+        context = multiprocessing.get_context("spawn")
+        monkeypatch.setattr(helpers.fileset_comparator, "_pool_context", lambda: context)
+
+    content = bytearray(os.urandom(20000))
+    (tmp_path / "dir1").mkdir()
+    (tmp_path / "dir1" / "old").write_bytes(content)
+
+    # Slightly modified file with a new name, and an unrelated larger file
+    content[100] ^= 0xff
+    (tmp_path / "dir2").mkdir()
+    (tmp_path / "dir2" / "new").write_bytes(content)
+    (tmp_path / "dir2" / "other").write_bytes(os.urandom(300000))
+
+    comparator = make_comparator(config, tmp_path / "dir1", tmp_path / "dir2")
+    pairs = list(comparator.get_files_to_compare())
+
+    assert [(f1.path.name, f2.path.name) for f1, f2 in pairs] == [("old", "new")]
+    assert [f.path.name for f in comparator.added_files] == ["other"]
+    assert len(comparator.removed_files) == 0
+
+
+def test_compare_unmatched_not_specialized(config, tmp_path):
+    (tmp_path / "dir1").mkdir()
+    (tmp_path / "dir2").mkdir()
+    (tmp_path / "dir2" / "link").symlink_to("/nonexisting")
+
+    comparator = make_comparator(config, tmp_path / "dir1", tmp_path / "dir2")
+    pairs = list(comparator.get_files_to_compare())
+
+    # Added files are only reported, so there's no need to specialize them
+    assert len(pairs) == 0
+    assert [f.__class__ for f in comparator.added_files] == [UnpackedFile]
@@ -0,0 +1,35 @@
+"""
+Copyright (C) 2020 Airbus
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import argparse
+
+from helpers.config import Config
+
+
+def test_config_file_values_typed(tmp_path):
+    config_file = tmp_path / "config.cfg"
+    config_file.write_text(
+        "[diff]\nfuzzy_threshold = 50\nextract = no\nsort_order = path\n"
+        "[unpack]\n[ExpertSettings]\n"
+    )
+
+    config = Config(argparse.Namespace(config_file=config_file))
+
+    assert config.fuzzy_threshold == 50
+    assert config.extract is False
+    assert config.sort_order == "path"
+    # Values are still stored as strings in the sections themselves
+    assert config.get("diff", "fuzzy_threshold") == "50"
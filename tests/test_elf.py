@@ -14,12 +14,16 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+import json
 import pytest
+import shutil
+import sqlite3
+import subprocess
 
 from .utils import get_files, make_config
 from helpers.file_comparator import FileComparator
 from helpers.fileset_comparator import FilesetComparator
-from files.elf import ElfFile
+from files.elf import ElfFile, _DIGESTS
 
 
 @pytest.fixture
@@ -67,3 +71,57 @@ def test_different(config, path1, path2):
     file1, file2 = next(pairs)
 
     assert not FileComparator.are_equal(file1, file2)
+
+
+def test_digest_reused(config, path1, path2):
+    comparator = make_comparator(config, path1, path2)
+    pairs = comparator.get_files_to_compare()
+    file1, file2 = next(pairs)
+
+    assert not FileComparator.are_equal(file1, file2)
+    assert _DIGESTS[file1._digest_key] == file1._comparable_digest()
+    assert _DIGESTS[file2._digest_key] != _DIGESTS[file1._digest_key]
+
+
+def test_fuzzy_hash_cached(config, path1, path2, tmp_path):
+    cache_file = tmp_path / "cache.db"
+    config.update("cache_file", str(cache_file))
+    comparator = make_comparator(config, path1, path2)
+    pairs = comparator.get_files_to_compare()
+    file1, _ = next(pairs)
+
+    fuzzy_hash = file1.fuzzy_hash
+    key = "tlsh:ElfFile:{}:%".format(file1.path.absolute())
+    with sqlite3.connect(cache_file) as connection:
+        rows = connection.execute("SELECT value FROM cache WHERE key LIKE ?", (key,)).fetchall()
+
+    assert [json.loads(value) for value, in rows] == [fuzzy_hash]
+
+
+def test_digest_reused_for_one_file(config, path1, path2, tmp_path):
+    comparator = make_comparator(config, path1, path2)
+    file1, file2 = next(comparator.get_files_to_compare())
+    assert not FileComparator.are_equal(file1, file2)
+
+    # Only the copy, which was never analyzed, needs readelf and objdump
+    copy = tmp_path / "test1.o"
+    shutil.copy(path2, copy)
+    comparator = make_comparator(config, path1, copy)
+    file1, file2 = next(comparator.get_files_to_compare())
+
+    assert not FileComparator.are_equal(file1, file2)
+    assert "_comparable_path" not in vars(file1)
+    assert "_comparable_path" in vars(file2)
+
+
+def test_different_code_only(config, path1, path2, tmp_path):
+    # Without data sections, one of the commands has nothing to run
+    for path in (path1, path2):
+        copy = tmp_path / "code" / path.split("/")[-1]
+        copy.parent.mkdir(exist_ok=True)
+        subprocess.run(["objcopy", "-j", ".text", path, copy], check=True, stderr=subprocess.DEVNULL)
+
+    comparator = make_comparator(config, tmp_path / "code" / "test1.o", tmp_path / "code" / "test2.o")
+    file1, file2 = next(comparator.get_files_to_compare())
+
+    assert not FileComparator.are_equal(file1, file2)
@@ -0,0 +1,85 @@
+"""
+Copyright (C) 2020 Airbus
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+import pytest
+
+from .utils import make_config
+from helpers.file_comparator import FileComparator, CHUNK_SIZE
+from files.generic import UnpackedFile
+
+
+@pytest.fixture
+def config():
+    config = make_config()
+    config.update("extract", False)
+    return config
+
+
+@pytest.fixture
+def content():
+    # Spans multiple chunks, and ends with a partial one
+    return os.urandom(3 * CHUNK_SIZE + 1000)
+
+
+def make_file(config, folder, name, content):
+    path = folder / name
+    path.write_bytes(content)
+    return UnpackedFile(path, config, folder)
+
+
+def test_equal(config, tmp_path, content):
+    file1 = make_file(config, tmp_path, "file1", content)
+    file2 = make_file(config, tmp_path, "file2", content)
+
+    assert FileComparator.are_equal(file1, file2)
+
+
+def test_different_last_chunk(config, tmp_path, content):
+    file1 = make_file(config, tmp_path, "file1", content)
+    file2 = make_file(config, tmp_path, "file2", content[:-1] + bytes([content[-1] ^ 0xff]))
+
+    assert not FileComparator.are_equal(file1, file2)
+
+
+def test_different_first_chunk(config, tmp_path, content):
+    file1 = make_file(config, tmp_path, "file1", content)
+    file2 = make_file(config, tmp_path, "file2", bytes([content[0] ^ 0xff]) + content[1:])
+
+    assert not FileComparator.are_equal(file1, file2)
+
+
+def test_different_size(config, tmp_path, content):
+    file1 = make_file(config, tmp_path, "file1", content)
+    file2 = make_file(config, tmp_path, "file2", content + b"\x00")
+
+    assert not FileComparator.are_equal(file1, file2)
+
+
+def test_empty(config, tmp_path):
+    file1 = make_file(config, tmp_path, "file1", b"")
+    file2 = make_file(config, tmp_path, "file2", b"")
+
+    assert FileComparator.are_equal(file1, file2)
+
+
+def test_small_files(config, tmp_path):
+    file1 = make_file(config, tmp_path, "file1", b"small content")
+    file2 = make_file(config, tmp_path, "file2", b"small content")
+    file3 = make_file(config, tmp_path, "file3", b"small CONTENT")
+
+    assert FileComparator.are_equal(file1, file2)
+    assert not FileComparator.are_equal(file1, file3)
@@ -0,0 +1,127 @@
+"""
+Copyright (C) 2020 Airbus
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import make_config
+from files.generic import UnpackedFile
+from helpers.digest_cache import cached, close_connections
+from helpers.utils import compute_distance
+
+
+@pytest.fixture
+def config():
+    config = make_config()
+    config.update("extract", False)
+    return config
+
+
+def make_file(config, folder, name, content):
+    path = folder / name
+    path.write_bytes(content)
+    return UnpackedFile(path, config, folder)
+
+
+@pytest.fixture
+def content():
+    # tlsh needs files with some randomness
+    return os.urandom(4096)
+
+
+def test_same_content(config, tmp_path, content):
+    file1 = make_file(config, tmp_path, "file1", content)
+    file2 = make_file(config, tmp_path, "file2", content)
+
+    assert file1.fuzzy_hash is not None
+    assert file1.fuzzy_hash == file2.fuzzy_hash
+
+
+def test_same_size(config, tmp_path, content):
+    file1 = make_file(config, tmp_path, "file1", content)
+    file2 = make_file(config, tmp_path, "file2", os.urandom(len(content)))
+    file3 = make_file(config, tmp_path, "file3", content)
+
+    assert file1.fuzzy_hash != file2.fuzzy_hash
+    assert file1.fuzzy_hash == file3.fuzzy_hash
+
+
+def test_small_file(config, tmp_path, content):
+    file = make_file(config, tmp_path, "file", content[:100])
+
+    assert file.fuzzy_hash is None
+
+
+def test_distance_without_fuzzy_hash(config, tmp_path, content):
+    file1 = make_file(config, tmp_path, "file1", content[:100])
+    file2 = make_file(config, tmp_path, "file2", content[:50] + bytes(b ^ 0xff for b in content[50:100]))
+
+    # 50 different bytes, each used to be a 12 bytes line in "cmp -l" output
+    assert compute_distance(file1, file2) == int(10 * 50 * 12 / 100)
+    assert compute_distance(file1, file1) == 1
+
+
+def test_cache_file(tmp_path):
+    path = tmp_path / "file"
+    path.write_bytes(b"content")
+    cache_file = str(tmp_path / "cache.db")
+    calls = []
+
+    def compute():
+        calls.append(path.read_bytes())
+        return {"value": len(calls)}
+
+    assert cached(cache_file, "kind", path, compute) == {"value": 1}
+    assert cached(cache_file, "kind", path, compute) == {"value": 1}
+
+    # Entries are ignored once the file changes
+    path.write_bytes(b"other content")
+    assert cached(cache_file, "kind", path, compute) == {"value": 2}
+    assert len(calls) == 2
+
+
+def test_cache_file_symlink(tmp_path):
+    (tmp_path / "target1").write_bytes(b"content")
+    (tmp_path / "target2").write_bytes(b"other content")
+    link = tmp_path / "link"
+    link.symlink_to("target1")
+    cache_file = str(tmp_path / "cache.db")
+
+    assert cached(cache_file, "kind", link, lambda: 1) == 1
+    assert cached(cache_file, "kind", link, lambda: 2) == 1
+
+    # Entries are ignored once the link points somewhere else
+    link.unlink()
+    link.symlink_to("target2")
+    assert cached(cache_file, "kind", link, lambda: 3) == 3
+
+
+def test_cache_file_closed(tmp_path):
+    path = tmp_path / "file"
+    path.write_bytes(b"content")
+    cache_file = str(tmp_path / "cache.db")
+
+    # Threads share the connection of their process
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        values = list(executor.map(lambda _: cached(cache_file, "kind", path, lambda: 1), range(8)))
+    assert values == [1] * 8
+
+    # The last connection to close checkpoints and removes the WAL file
+    close_connections()
+    assert not os.path.exists(cache_file + "-wal")
+    assert cached(cache_file, "kind", path, lambda: 2) == 1
+    close_connections()
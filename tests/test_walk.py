@@ -14,9 +14,12 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+import os
+
 import pytest
 
 from .utils import get_files, make_config
+from helpers.utils import get_file_type
 
 
 @pytest.fixture
@@ -54,3 +57,56 @@ def test_walk_exclude_mime(config, path1, path2):
     files1, files2 = get_files(config, path1, path2)
     assert len(files1) == 1
     assert len(files2) == 1
+
+
+def test_walk_listing_error(config, tmp_path, monkeypatch):
+    (tmp_path / "broken").mkdir()
+    (tmp_path / "broken" / "file").write_text("some text\n")
+    (tmp_path / "ok").mkdir()
+    (tmp_path / "ok" / "file").write_text("some text\n")
+
+    # Simulate an error happening after the directory was opened
+    scandir = os.scandir
+
+    def broken_scandir(path):
+        entries = scandir(path)
+        if os.path.basename(path) != "broken":
+            return entries
+        entries.close()
+        return BrokenEntries()
+
+    class BrokenEntries:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            pass
+
+        def __iter__(self):
+            raise OSError("listing failed")
+
+    monkeypatch.setattr(os, "scandir", broken_scandir)
+    files1, files2 = get_files(config, tmp_path, tmp_path)
+    assert [file.path.parent.name for file in files1] == ["ok"]
+    assert [file.path.parent.name for file in files2] == ["ok"]
+
+
+def test_file_type_changed(tmp_path):
+    path = tmp_path / "file"
+    path.write_text("some text\n")
+    assert get_file_type(path)["mime"] == "text/plain"
+
+    # Cached types must not be reused once the file changes
+    path.write_bytes(b"")
+    assert get_file_type(path)["mime"] == "inode/x-empty"
+
+
+def test_file_type_replaced_by_symlink(tmp_path):
+    path = tmp_path / "file"
+    path.write_text("some text\n")
+    assert get_file_type(path)["mime"] == "text/plain"
+
+    # The link points to the same inode the file had, but is not a text file
+    path.rename(tmp_path / "target")
+    path.symlink_to("target")
+    assert get_file_type(path)["mime"] == "inode/symlink"
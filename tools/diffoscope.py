@@ -19,6 +19,7 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import os
 import sys
+import stat
 import shutil
 import pathlib
 import argparse
@@ -47,12 +48,50 @@ def _hardlink_file(file, dir, prefix=""):
         pass
 
 
+def _can_copy_file_range(file, dst):
+    """
+    Whether the fast path can be used: it skips shutil's checks, so only take
+    it for regular files which aren't being copied onto themselves
+    """
+    if not hasattr(os, "copy_file_range"):
+        return False
+
+    try:
+        if not stat.S_ISREG(os.stat(file).st_mode):
+            return False
+        return not os.path.samefile(file, dst)
+    except FileNotFoundError:
+        # The destination doesn't exist yet
+        return os.path.exists(file)
+
+
+def _copy_file_range(file, dst):
+    # Let the kernel copy the data, which only shares the blocks on
+    # filesystems supporting reflinks (btrfs, XFS...)
+    with open(file, "rb") as src, open(dst, "wb") as out:
+        remaining = os.fstat(src.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(src.fileno(), out.fileno(), remaining)
+            if copied == 0:
+                break
+            remaining -= copied
+
+    shutil.copymode(file, dst)
+
+
 def _copy_file(file, dir, prefix=""):
     dst = _get_file_output_path(file, dir, prefix)
 
     # Copy the file to the matching place in the tmp dir so hierachy is kept
     try:
         os.makedirs(dst.parent, exist_ok=True)
+        if _can_copy_file_range(file, dst):
+            try:
+                _copy_file_range(file, dst)
+                return
+            except OSError:
+                # Not supported between these filesystems (or by the kernel)
+                pass
         shutil.copy(file, dst)
     except shutil.SameFileError:
         # This file was already copied, don't do it again
@@ -116,7 +155,8 @@ def copy_files(pairs, tmp1, tmp2):
     """
     Copy files which need to be compared to a temporary directory so diffoscope
     only diffs them
-    Files have to be copied (not linked) as diffoscope doesn't follow symlinks
+    Files are hardlinked or copied (not symlinked) as diffoscope doesn't
+    follow symlinks
     """
     file_count = 0
 
@@ -21,11 +21,13 @@
 # You should have received a copy of the GNU General Public License
 # along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
 
+import io
 import os
 import re
 import logging
 import subprocess
 import collections
+from functools import lru_cache
 
 from diffoscope.exc import OutputParsingError
 from diffoscope.tools import get_tool_name, tool_required
@@ -58,8 +60,30 @@ DEBUG_SECTION_GROUPS = (
 
 logger = logging.getLogger(__name__)
 
+# Building blocks for the regex filtering columns of readelf's output
+_HEX_REGEX = rb"[0-9a-f]+"  # Match hex value without 0x
+_COLUMN_REGEX = rb"\S+\s+"  # Match any column
+_HEX_COLUMN_REGEX = rb"%b\s+" % (_HEX_REGEX)  # Match a column with a hex
+
+
+@lru_cache(maxsize=256)
+def _compile_path_regex(path):
+    """
+    Regex removing the given path from readelf's output, shared by all the
+    commands run on the same file
+    """
+    path_dir = re.escape(os.path.dirname(path).encode("utf-8"))
+    path_re = re.compile(rb"\b%s/\b" % path_dir)
+    # we don't care about the name of the archive
+    archive_re = re.compile(rb"^File: %s\(" % re.escape(path.encode("utf-8")))
+    return path_re, archive_re
+
 
 class Readelf(Command):
+    # We don't care about offsets
+    # _filter_re = re.compile(rboffset 0x[0-9a-f]+)
+    _filter_re = re.compile(rb"\b0x[0-9a-f]+\b")
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._init_regex()
@@ -91,22 +115,15 @@ class Readelf(Command):
         """
         Create and compile regex to filter output lines
         """
-        # we don't care about the name of the archive
-        path_dir = re.escape(os.path.dirname(self.path).encode("utf-8"))
-        path = re.escape(self.path.encode("utf-8"))
-        self._path_re = re.compile(rb"\b%s/\b" % path_dir)
-        self._archive_re = re.compile(rb"^File: %s\(" % path)
-
-        # We don't care about offsets
-        # self._filter_re = re.compile(rboffset 0x[0-9a-f]+)
-        self._filter_re = re.compile(rb"\b0x[0-9a-f]+\b")
+        self._path_re, self._archive_re = _compile_path_regex(self.path)
 
         # In case subclasses have custom regex
         self.init_regex()
 
     def init_regex(self):
         """
-        Method to override
+        Method to override for regex depending on the instance (static ones
+        should be class attributes, so they are only compiled once)
         """
         pass
 
@@ -120,16 +137,17 @@ class Readelf(Command):
 
     @property
     def output(self):
-        return self._process.stdout.splitlines(True)
+        # Lines are produced as they are iterated, rather than building a list
+        # of all of them (BytesIO shares the buffer of stdout until written)
+        return io.BytesIO(self._process.stdout)
 
 
 class ReadelfFileHeader(Readelf):
     def readelf_options(self):
         return ["--file-header"]
 
-    def init_regex(self):
-        self._entry_re = re.compile(rb"(Entry point address:\s+)0x[0-9a-f]+")
-        self._size_re = re.compile(rb"[0-9]+ \(bytes( into file)?\)")
+    _entry_re = re.compile(rb"(Entry point address:\s+)0x[0-9a-f]+")
+    _size_re = re.compile(rb"[0-9]+ \(bytes( into file)?\)")
 
     def filter_stdout(self, line):
         line = super().filter_stdout(line)
@@ -141,8 +159,7 @@ class ReadelfProgramHeader(Readelf):
     def readelf_options(self):
         return ["--program-header"]
 
-    def init_regex(self):
-        self._addr_re = re.compile(rb"0x[0-9a-f]*")
+    _addr_re = re.compile(rb"0x[0-9a-f]*")
 
     def filter_stdout(self, line):
         # No need to call super as this is more strict
@@ -153,27 +170,21 @@ class ReadelfSections(Readelf):
     def readelf_options(self):
         return ["--sections"]
 
-    def init_regex(self):
-        # Lines look like this:
-        # "  [Nr] Name    Type     Address           Off      Size     [...]"
-        # "  [ 1] interp  PROGBITS 0000000000400238  000238   00001c   [...]"
-        start_regex = rb"\s*\[\s*[0-9]+\] "  # Match "  [  1] "
-        column_regex = rb"\S+\s+"  # Match any column
-        hex_regex = rb"[0-9a-f]+"  # Match hex value without 0x
-
-        # We want to get rid of the address and offset
-        addr_regex = rb"(^%b%b)%b" % (start_regex, 2 * column_regex, hex_regex)
-        offset_regex = rb"(^%b%b)%b" % (
-            start_regex,
-            3 * column_regex,
-            hex_regex,
-        )
-        size_regex = rb"(^%b%b)%b" % (start_regex, 4 * column_regex, hex_regex)
+    # Lines look like this:
+    # "  [Nr] Name    Type     Address           Off      Size     [...]"
+    # "  [ 1] interp  PROGBITS 0000000000400238  000238   00001c   [...]"
+    _start_regex = rb"\s*\[\s*[0-9]+\] "  # Match "  [  1] "
 
-        # Compile to save time
-        self._addr_re = re.compile(addr_regex)
-        self._offset_re = re.compile(offset_regex)
-        self._size_re = re.compile(size_regex)
+    # We want to get rid of the address and offset
+    _addr_re = re.compile(
+        rb"(^%b%b)%b" % (_start_regex, 2 * _COLUMN_REGEX, _HEX_REGEX)
+    )
+    _offset_re = re.compile(
+        rb"(^%b%b)%b" % (_start_regex, 3 * _COLUMN_REGEX, _HEX_REGEX)
+    )
+    _size_re = re.compile(
+        rb"(^%b%b)%b" % (_start_regex, 4 * _COLUMN_REGEX, _HEX_REGEX)
+    )
 
     def filter_stdout(self, line):
         # Take care of the last column first, just in case we mess up the format
@@ -190,20 +201,14 @@ class ReadelfSymbols(Readelf):
     def should_skip_section(section_name, section_type):
         return section_type in {"DYNSYM", "SYMTAB"}
 
-    def init_regex(self):
-        # Lines look like this:
-        # "  Num: Value             Size     Type   [...]"
-        # "    1: 000000000040f860  22       FUNC   [...]"
-        start_regex = rb"\s*[0-9]+:\s+"  # Match "  1: "
-        hex_regex = rb"[0-9a-f]+"  # Match hex value without 0x
-
-        # We want to get rid of the size and address
-        addr_regex = rb"(^%b)%b" % (start_regex, hex_regex)
-        size_regex = rb"(^%b%b)\s+[0-9]+" % (start_regex, hex_regex)
+    # Lines look like this:
+    # "  Num: Value             Size     Type   [...]"
+    # "    1: 000000000040f860  22       FUNC   [...]"
+    _start_regex = rb"\s*[0-9]+:\s+"  # Match "  1: "
 
-        # Compile to save time
-        self._addr_re = re.compile(addr_regex)
-        self._size_re = re.compile(size_regex)
+    # We want to get rid of the size and address
+    _addr_re = re.compile(rb"(^%b)%b" % (_start_regex, _HEX_REGEX))
+    _size_re = re.compile(rb"(^%b%b)\s+[0-9]+" % (_start_regex, _HEX_REGEX))
 
     def filter_stdout(self, line):
         line = super().filter_stdout(line)
@@ -219,31 +224,21 @@ class ReadelfRelocs(Readelf):
     def should_skip_section(section_name, section_type):
         return section_type in {"REL", "RELA"}
 
-    def init_regex(self):
-        # Lines look like this:
-        # "  Offset           Info             Type               Symbol's Value    Symbol's Name + Addend [...]"
-        # "  00000000005623b0 0000002d00000006 R_X86_64_GLOB_DAT  0000000000000000  .debug_str + 7ca9      [...]"
-        column_regex = rb"\S+\s+"  # Match any column
-        hex_regex = rb"[0-9a-f]+"  # Match hex value without 0x
-        hex_column_regex = rb"%b\s+" % (hex_regex)  # Match a column with a hex
-
-        # We want to get rid of the address and offset
-        offset_regex = rb"^%b" % (hex_regex)
-        info_regex = rb"(^%b)%b" % (hex_column_regex, hex_regex)
-        value_regex = rb"(^%b)%b" % (
-            2 * hex_column_regex + column_regex,
-            hex_regex,
-        )
-        addend_regex = rb"(^%b)(\..*\s\+\s)%b" % (
-            2 * hex_column_regex + column_regex + hex_column_regex,
-            hex_regex,
-        )
-
-        # Compile to save time
-        self._offset_re = re.compile(offset_regex)
-        self._info_re = re.compile(info_regex)
-        self._value_re = re.compile(value_regex)
-        self._addend_re = re.compile(addend_regex)
+    # Lines look like this:
+    # "  Offset           Info             Type               Symbol's Value    Symbol's Name + Addend [...]"
+    # "  00000000005623b0 0000002d00000006 R_X86_64_GLOB_DAT  0000000000000000  .debug_str + 7ca9      [...]"
+
+    # We want to get rid of the address and offset
+    _offset_re = re.compile(rb"^%b" % (_HEX_REGEX))
+    _info_re = re.compile(rb"(^%b)%b" % (_HEX_COLUMN_REGEX, _HEX_REGEX))
+    _value_re = re.compile(rb"(^%b)%b" % (
+        2 * _HEX_COLUMN_REGEX + _COLUMN_REGEX,
+        _HEX_REGEX,
+    ))
+    _addend_re = re.compile(rb"(^%b)(\..*\s\+\s)%b" % (
+        2 * _HEX_COLUMN_REGEX + _COLUMN_REGEX + _HEX_COLUMN_REGEX,
+        _HEX_REGEX,
+    ))
 
     def filter_stdout(self, line):
         line = super().filter_stdout(line)
@@ -262,10 +257,9 @@ class ReadelfDynamic(Readelf):
     def should_skip_section(section_name, section_type):
         return section_type == "DYNAMIC"
 
-    def init_regex(self):
-        self._addr_re = re.compile(rb"0x[0-9a-f]+")
-        self._size_re = re.compile(rb"[0-9]+ \(bytes\)")
-        self._date_re = re.compile(rb"(\s+\(GNU_PRELINKED\)\s+) \d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}")
+    _addr_re = re.compile(rb"0x[0-9a-f]+")
+    _size_re = re.compile(rb"[0-9]+ \(bytes\)")
+    _date_re = re.compile(rb"(\s+\(GNU_PRELINKED\)\s+) \d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}")
 
     def filter_stdout(self, line):
         # Remove sizes (no need to call super as this takes care of more)
@@ -290,8 +284,7 @@ class ReadelfVersionInfo(Readelf):
     def should_skip_section(section_name, section_type):
         return section_type in {"VERDEF", "VERSYM", "VERNEED"}
 
-    def init_regex(self):
-        self._filter_re = re.compile(rb"[0-9]\s\(\*(global|local)\*\)")
+    _filter_re = re.compile(rb"[0-9]\s\(\*(global|local)\*\)")
 
     def filter_stdout(self, line):
         # Remove sizes (no need to call super)
@@ -349,8 +342,7 @@ class ReadelfStringSection(ReadElfSection):
             "--string-dump={}".format(self.section_name)
         ]
 
-    def init_regex(self):
-        self._filter_re = re.compile(rb"^\s*\[\s*[0-9a-f]+\]\s*")
+    _filter_re = re.compile(rb"^\s*\[\s*[0-9a-f]+\]\s*")
 
     def filter_stdout(self, line):
         # Remove string offsets (no need to call super)
@@ -358,12 +350,26 @@ class ReadelfStringSection(ReadElfSection):
 
 
 class ObjdumpSection(Command):
+    # Remove the leading hex value (offset of the instruction)
+    _line_re = re.compile(rb"^\s*[0-9a-f]+:\s*")
+    # Remove addresses that have been resolved to a symbol
+    # First, parse lines that look like:
+    # "callq 80487e0 print_usage(char const*)"
+    _resolved_re = re.compile(rb"\b([0-9a-f]+)(?=\s+\<.+\>)")
+    # Then, parse lines that look like:
+    # "lea  0x111cb4 (%rip),%rsi     # 12a012 <_fini+0xc4>"
+    # _pointer_re = re.compile(rb"\b(0x[0-9a-f]+)\b(?=.*\<.+\>)")
+    # Remove all hex values (broader than previous regex, so replacing it)
+    _filter_re = re.compile(rb"\b0x[0-9a-f]+\b")
+    # Remonve numerical constants in standard operations like:
+    # "addi    r30,r30,-28620"
+    _constants_re = re.compile(rb",-?[0-9]+")
+
     def __init__(self, path, section_name, *args, **kwargs):
         self._path = path
         self._path_bin = path.encode("utf-8")
         self._section_name = section_name
         super().__init__(path, *args, **kwargs)
-        self.init_regex()
 
     def objdump_options(self):
         return []
@@ -390,22 +396,6 @@ class ObjdumpSection(Command):
 
         return self.filter_stdout(line)
 
-    def init_regex(self):
-        # Remove the leading hex value (offset of the instruction)
-        self._line_re = re.compile(rb"^\s*[0-9a-f]+:\s*")
-        # Remove addresses that have been resolved to a symbol
-        # First, parse lines that look like:
-        # "callq 80487e0 print_usage(char const*)"
-        self._resolved_re = re.compile(rb"\b([0-9a-f]+)(?=\s+\<.+\>)")
-        # Then, parse lines that look like:
-        # "lea  0x111cb4 (%rip),%rsi     # 12a012 <_fini+0xc4>"
-        # self._pointer_re = re.compile(rb"\b(0x[0-9a-f]+)\b(?=.*\<.+\>)")
-        # Remove all hex values (broader than previous regex, so replacing it)
-        self._filter_re = re.compile(rb"\b0x[0-9a-f]+\b")
-        # Remonve numerical constants in standard operations like:
-        # "addi    r30,r30,-28620"
-        self._constants_re = re.compile(rb",-?[0-9]+")
-
     def filter_stdout(self, line):
         line = self._line_re.sub(b"", line)
         line = self._resolved_re.sub(b"XXX", line)
@@ -462,7 +452,7 @@ def _compare_elf_data(path1, path2):
     ]
 
 
-IGNORE_SECTIONS = [
+IGNORE_SECTIONS = frozenset([
     ".hash",
     ".gnu.hash",
     ".strtab",
@@ -499,7 +489,7 @@ IGNORE_SECTIONS = [
     ".gnu_debugaltlink",
     ".ARM.extab",
     ".ARM.exidx",
-]
+])
 
 
 def _should_skip_section(name, type):
@@ -508,7 +498,7 @@ def _should_skip_section(name, type):
             logger.debug("Skipping section %s, covered by %s", name, x)
             return True
 
-    if name.startswith(".debug") or name.startswith(".zdebug"):
+    if name.startswith((".debug", ".zdebug")):
         return True
 
     if name in IGNORE_SECTIONS:
@@ -669,6 +659,13 @@ class ElfContainer(DecompilableContainer):
         "_": ElfSection,
     }
 
+    # Entries of readelf --section-headers have the following columns:
+    # [Nr]  Name  Type  Address  Off  Size  ES  Flg  Lk  Inf  Al
+    # The number column is skipped because there may be spaces in the brakets
+    SECTION_HEADER_RE = re.compile(
+        r"[^\]]*\]\s*(\S+)\s+(\S+)(?:\s+\S+){4}\s+(\S+)"
+    )
+
     @tool_required("readelf")
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -684,21 +681,18 @@ class ElfContainer(DecompilableContainer):
         has_debug_symbols = False
 
         try:
-            output = output.decode("utf-8").split("\n")
+            output = output.decode("utf-8").splitlines()
             if output[1].startswith("File:"):
                 output = output[2:]
             output = output[5:]
 
-            # Entries of readelf --section-headers have the following columns:
-            # [Nr]  Name  Type  Address  Off  Size  ES  Flg  Lk  Inf  Al
             self._sections = collections.OrderedDict()
             for line in output:
                 if line.startswith("Key to Flags"):
                     break
 
-                # Strip number column because there may be spaces in the brakets
-                line = line.split("]", 1)[1].split()
-                name, type, flags = line[0], line[1], line[6] + "_"
+                name, type, flags = self.SECTION_HEADER_RE.match(line).groups()
+                flags += "_"
 
                 if name.startswith(".debug") or name.startswith(".zdebug"):
                     has_debug_symbols = True
@@ -707,11 +701,10 @@ class ElfContainer(DecompilableContainer):
                     continue
 
                 # Use first match, with last option being '_' as fallback
-                elf_class = [
-                    ElfContainer.SECTION_FLAG_MAPPING[x]
-                    for x in flags
-                    if x in ElfContainer.SECTION_FLAG_MAPPING
-                ][0]
+                for flag in flags:
+                    elf_class = ElfContainer.SECTION_FLAG_MAPPING.get(flag)
+                    if elf_class is not None:
+                        break
 
                 logger.debug(
                     "Adding section %s (%s) as %s", name, type, elf_class